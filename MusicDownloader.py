@@ -1,711 +1,1476 @@
-import os
-import sys
-import argparse
-import re
-from pathlib import Path
-import yt_dlp
-import mutagen
-from mutagen.easyid3 import EasyID3
-from mutagen.id3 import ID3, APIC, TALB, TPE1, TPE2, TIT2, TRCK, TYER, TCON
-import requests
-import json
-from difflib import SequenceMatcher
-from urllib.parse import urlparse
-import time
-
-class MusicDownloader:
-    def __init__(self, output_dir="downloads", auto_metadata=True, download_album_art=True):
-        """Initialize the music downloader with the output directory."""
-        self.output_dir = output_dir
-        self.auto_metadata = auto_metadata
-        self.download_album_art = download_album_art
-        self.ensure_dir_exists(output_dir)
-        self.check_ytdlp_version()
-    
-    def ensure_dir_exists(self, directory):
-        """Create directory if it doesn't exist."""
-        if not os.path.exists(directory):
-            os.makedirs(directory)
-            print(f"Created directory: {directory}")
-    
-    def check_ytdlp_version(self):
-        """Check yt-dlp version and provide update information if needed."""
-        try:
-            import yt_dlp
-            version = yt_dlp.version.__version__
-            print(f"Using yt-dlp version: {version}")
-            
-            # If we encounter errors, this will be helpful information
-            if hasattr(yt_dlp, '__version__'):
-                print(f"Full version info: {yt_dlp.__version__}")
-                
-        except Exception as e:
-            print(f"Could not determine yt-dlp version: {e}")
-            print("Consider updating yt-dlp with: pip install --upgrade yt-dlp")
-    
-    def list_formats(self, url):
-        """List available formats for a URL (useful for debugging)."""
-        try:
-            with yt_dlp.YoutubeDL({'quiet': True, 'listformats': True}) as ydl:
-                info = ydl.extract_info(url, download=False)
-                if 'formats' in info:
-                    print(f"Available formats for {url}:")
-                    for fmt in info['formats']:
-                        print(f"  {fmt.get('format_id', 'N/A')} - {fmt.get('ext', 'N/A')} - {fmt.get('format_note', 'N/A')}")
-                else:
-                    print("No format information available")
-        except Exception as e:
-            print(f"Error listing formats: {e}")
-    
-    def sanitize_filename(self, filename):
-        """Remove invalid characters from filename."""
-        return re.sub(r'[\\/*?:"<>|]', "", filename)
-    
-    def extract_title_artist(self, title):
-        """Extract artist and title from YouTube title format."""
-        # Common patterns: "Artist - Title", "Artist – Title", "Artist: Title"
-        patterns = [
-            r"^(.*?)\s*-\s*(.*?)$",
-            r"^(.*?)\s*–\s*(.*?)$",
-            r"^(.*?)\s*:\s*(.*?)$"
-        ]
-        
-        for pattern in patterns:
-            match = re.match(pattern, title)
-            if match:
-                artist = match.group(1).strip()
-                title = match.group(2).strip()
-                return artist, title
-        
-        # No match found, try to find featuring artists
-        if " feat" in title.lower() or " ft." in title.lower() or " ft " in title.lower():
-            for separator in [" feat. ", " feat ", " ft. ", " ft "]:
-                if separator.lower() in title.lower():
-                    parts = title.split(separator, 1)
-                    if len(parts) == 2:
-                        return parts[0].strip(), f"{parts[0].strip()} feat. {parts[1].strip()}"
-        
-        # If nothing matches, return original as title and Unknown as artist
-        return "Unknown Artist", title
-    
-    def search_musicbrainz(self, title, artist=None):
-        """Search MusicBrainz API for metadata."""
-        try:
-            query = title
-            if artist:
-                query = f"{artist} {title}"
-            
-            url = f"https://musicbrainz.org/ws/2/recording/?query={query}&fmt=json&inc=releases+artist-credits+tags"
-            headers = {
-                "User-Agent": "MusicDownloader/1.0 (your@email.com)"  # Required by MusicBrainz
-            }
-            
-            # Add delay to respect MusicBrainz rate limiting
-            time.sleep(1)
-            
-            response = requests.get(url, headers=headers)
-            if response.status_code == 200:
-                data = response.json()
-                if "recordings" in data and len(data["recordings"]) > 0:
-                    best_match = None
-                    best_score = 0
-                    
-                    for recording in data["recordings"]:
-                        # Calculate similarity score
-                        rec_title = recording.get("title", "")
-                        rec_artist = recording.get("artist-credit", [{}])[0].get("name", "") if recording.get("artist-credit") else ""
-                        
-                        title_score = SequenceMatcher(None, title.lower(), rec_title.lower()).ratio()
-                        artist_score = 0.5  # Default if no artist provided
-                        
-                        if artist:
-                            artist_score = SequenceMatcher(None, artist.lower(), rec_artist.lower()).ratio()
-                        
-                        # Weighted score - title more important than artist
-                        score = (title_score * 0.6) + (artist_score * 0.4)
-                        
-                        if score > best_score:
-                            best_score = score
-                            best_match = recording
-                    
-                    if best_match and best_score > 0.6:  # Only use if good match
-                        metadata = {
-                            "title": best_match.get("title"),
-                            "artist": None,
-                            "album": None,
-                            "year": None,
-                            "genre": None,
-                            "track": None,
-                            "album_art_url": None
-                        }
-                        
-                        # Get artist information
-                        if best_match.get("artist-credit"):
-                            artists = []
-                            for artist_credit in best_match["artist-credit"]:
-                                if isinstance(artist_credit, dict) and "artist" in artist_credit:
-                                    artists.append(artist_credit["artist"]["name"])
-                                elif isinstance(artist_credit, dict) and "name" in artist_credit:
-                                    artists.append(artist_credit["name"])
-                            if artists:
-                                metadata["artist"] = ", ".join(artists)
-                        
-                        # Get genre from tags
-                        if "tags" in best_match and best_match["tags"]:
-                            # Get the most popular tag as genre
-                            sorted_tags = sorted(best_match["tags"], key=lambda x: x.get("count", 0), reverse=True)
-                            if sorted_tags:
-                                metadata["genre"] = sorted_tags[0]["name"]
-                        
-                        # Try to get album info and cover art
-                        if "releases" in best_match and len(best_match["releases"]) > 0:
-                            release = best_match["releases"][0]
-                            metadata["album"] = release.get("title")
-                            
-                            if "date" in release:
-                                metadata["year"] = release["date"][:4] if release["date"] else None
-                            
-                            # Get track number from release
-                            if "track-number" in release:
-                                metadata["track"] = release["track-number"]
-                            
-                            # Try to get cover art from Cover Art Archive
-                            release_id = release.get("id")
-                            if release_id:
-                                cover_art_url = self.get_cover_art_url(release_id)
-                                if cover_art_url:
-                                    metadata["album_art_url"] = cover_art_url
-                        
-                        # Filter out None values
-                        return {k: v for k, v in metadata.items() if v is not None}
-            
-            return {}
-        except Exception as e:
-            print(f"Error fetching metadata from MusicBrainz: {e}")
-            return {}
-    
-    def get_cover_art_url(self, release_id):
-        """Get cover art URL from MusicBrainz Cover Art Archive."""
-        try:
-            url = f"https://coverartarchive.org/release/{release_id}"
-            headers = {
-                "User-Agent": "MusicDownloader/1.0 (your@email.com)"
-            }
-            
-            # Add delay to respect rate limiting
-            time.sleep(0.5)
-            
-            response = requests.get(url, headers=headers)
-            if response.status_code == 200:
-                data = response.json()
-                if "images" in data and len(data["images"]) > 0:
-                    # Get the first (usually front) cover image
-                    for image in data["images"]:
-                        if image.get("front", False) or not any(img.get("front", False) for img in data["images"]):
-                            return image.get("image")
-            return None
-        except Exception as e:
-            print(f"Error fetching cover art: {e}")
-            return None
-    
-    def download_album_art(self, url, file_path):
-        """Download album art and return the image data."""
-        try:
-            headers = {
-                "User-Agent": "MusicDownloader/1.0 (your@email.com)"
-            }
-            response = requests.get(url, headers=headers, timeout=30)
-            if response.status_code == 200:
-                return response.content
-            return None
-        except Exception as e:
-            print(f"Error downloading album art: {e}")
-            return None
-    
-    def get_metadata_from_youtube(self, info):
-        """Extract metadata from YouTube info."""
-        title = info.get('title', '')
-        artist, extracted_title = self.extract_title_artist(title)
-        
-        metadata = {
-            'title': extracted_title,
-            'artist': artist,
-        }
-        
-        # Try to get album from YouTube info
-        if 'album' in info:
-            metadata['album'] = info['album']
-        
-        # Try to get artist from YouTube info (channel name, uploader, etc.)
-        if 'uploader' in info and info['uploader']:
-            # Use uploader as artist if we couldn't extract from title
-            if artist == "Unknown Artist":
-                metadata['artist'] = info['uploader']
-        
-        if 'channel' in info and info['channel']:
-            # Use channel name as artist if available and more reliable
-            if artist == "Unknown Artist" or "Topic" in info['channel']:
-                clean_channel = info['channel'].replace(" - Topic", "").replace("VEVO", "").strip()
-                if clean_channel:
-                    metadata['artist'] = clean_channel
-        
-        # Try to get track number
-        if 'track' in info:
-            metadata['track'] = info['track']
-        elif 'playlist_index' in info:
-            metadata['track'] = str(info['playlist_index'])
-        
-        # Try to get upload date as year
-        if 'upload_date' in info:
-            metadata['year'] = info['upload_date'][:4]  # First 4 chars should be year
-        
-        # Try to get genre from YouTube info
-        if 'genre' in info:
-            if isinstance(info['genre'], list) and info['genre']:
-                metadata['genre'] = info['genre'][0]
-            elif isinstance(info['genre'], str):
-                metadata['genre'] = info['genre']
-        
-        # Try to get categories as genre fallback
-        if 'categories' in info and info['categories'] and 'genre' not in metadata:
-            if isinstance(info['categories'], list) and info['categories']:
-                # Filter out generic categories
-                categories = [cat for cat in info['categories'] if cat.lower() not in ['music', 'entertainment']]
-                if categories:
-                    metadata['genre'] = categories[0]
-        
-        # Try to get thumbnail for album art
-        if 'thumbnail' in info:
-            metadata['album_art_url'] = info['thumbnail']
-        elif 'thumbnails' in info and info['thumbnails']:
-            # Get the highest quality thumbnail
-            thumbnails = sorted(info['thumbnails'], key=lambda x: x.get('width', 0) * x.get('height', 0), reverse=True)
-            if thumbnails:
-                metadata['album_art_url'] = thumbnails[0]['url']
-        
-        return metadata
-    
-    def enrich_metadata(self, basic_metadata):
-        """Enrich metadata with MusicBrainz if possible."""
-        if not self.auto_metadata:
-            return basic_metadata
-        
-        title = basic_metadata.get('title')
-        artist = basic_metadata.get('artist')
-        
-        if title:
-            mb_metadata = self.search_musicbrainz(title, artist)
-            # Merge metadata, prioritizing MusicBrainz but keeping YouTube data as fallback
-            for key, value in mb_metadata.items():
-                basic_metadata[key] = value
-        
-        return basic_metadata
-    
-    def download_song(self, url, metadata=None):
-        """Download a single song and update its metadata."""
-        if metadata is None:
-            metadata = {}
-        
-        # Configure yt-dlp options with better format selection and error handling
-        ydl_opts = {
-            'format': 'bestaudio[ext=m4a]/bestaudio[ext=mp3]/bestaudio/best[height<=720]/best',
-            'postprocessors': [{
-                'key': 'FFmpegExtractAudio',
-                'preferredcodec': 'mp3',
-                'preferredquality': '320',
-            }],
-            'quiet': False,
-            'no_warnings': False,
-            'ignoreerrors': False,
-            'extract_flat': False,
-        }
-        
-        # First extract info without downloading
-        try:
-            with yt_dlp.YoutubeDL({'quiet': True, 'ignoreerrors': True}) as ydl:
-                info = ydl.extract_info(url, download=False)
-                
-                # Get metadata from YouTube
-                youtube_metadata = self.get_metadata_from_youtube(info)
-                
-                # Merge with user-provided metadata, user's takes precedence
-                combined_metadata = {**youtube_metadata, **metadata}
-                
-                # Enrich with MusicBrainz if enabled
-                final_metadata = self.enrich_metadata(combined_metadata)
-                
-                # Get artist and title for folder name
-                artist = final_metadata.get('artist', 'Unknown Artist')
-                title = final_metadata.get('title', 'Unknown Title')
-                album = final_metadata.get('album', 'Single')
-                
-                # For singles, create artist folder with song file
-                if album == 'Single' or not album:
-                    folder_name = self.sanitize_filename(artist)
-                else:
-                    # For album tracks, create artist/album folder
-                    folder_name = self.sanitize_filename(f"{artist}/{album}")
-                
-                output_path = os.path.join(self.output_dir, folder_name)
-                self.ensure_dir_exists(output_path)
-                
-                # Update download options with path
-                ydl_opts['outtmpl'] = f'{output_path}/%(title)s.%(ext)s'
-        
-        except Exception as e:
-            print(f"Error extracting video info: {e}")
-            # Use basic metadata if info extraction fails
-            final_metadata = metadata if metadata else {'title': 'Unknown Title', 'artist': 'Unknown Artist'}
-            output_path = os.path.join(self.output_dir, 'Unknown Artist')
-            self.ensure_dir_exists(output_path)
-            ydl_opts['outtmpl'] = f'{output_path}/%(title)s.%(ext)s'
-        
-        # Now download with the configured options
-        try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=True)
-                downloaded_file = ydl.prepare_filename(info).replace('.webm', '.mp3').replace('.m4a', '.mp3')
-            
-            # Update metadata
-            if os.path.exists(downloaded_file):
-                self.update_metadata(downloaded_file, final_metadata)
-                print(f"Downloaded with metadata: {final_metadata}")
-                return downloaded_file
-            else:
-                print(f"Warning: Downloaded file not found at expected location: {downloaded_file}")
-                return None
-                
-        except Exception as e:
-            print(f"Error downloading video: {e}")
-            print("This might be due to:")
-            print("1. Video being unavailable or private")
-            print("2. Geographic restrictions")
-            print("3. YouTube format changes")
-            print("4. Network issues")
-            print("\nSuggestions:")
-            print("- Try updating yt-dlp: pip install --upgrade yt-dlp")
-            print("- Check if the video is accessible in your browser")
-            print("- Try a different video URL")
-            return None
-    
-    def download_album(self, url, album_metadata=None):
-        """Download an album (playlist) and update metadata for all songs."""
-        if album_metadata is None:
-            album_metadata = {}
-        
-        # Configure yt-dlp options for info extraction with error handling
-        info_opts = {
-            'quiet': True,
-            'extract_flat': True,  # Only extract basic info first
-            'ignoreerrors': True,  # Continue even if some videos fail
-        }
-        
-        with yt_dlp.YoutubeDL(info_opts) as ydl:
-            try:
-                info = ydl.extract_info(url, download=False)
-            except Exception as e:
-                print(f"Error extracting playlist info: {e}")
-                print("Trying to download as single song instead...")
-                return self.download_song(url, album_metadata)
-            
-            # Check if this is a playlist
-            if 'entries' not in info:
-                print("The URL does not appear to be a playlist. Downloading as single song instead.")
-                return self.download_song(url, album_metadata)
-            
-            # Try to get album name from playlist title
-            playlist_title = info.get('title', 'Unknown Album')
-            
-            # If user provided album name, use that instead
-            album_name = album_metadata.get('album', playlist_title)
-            
-            # Try to get artist from multiple sources
-            artist_name = album_metadata.get('artist')
-            
-            # Try to extract artist from playlist uploader/channel
-            if not artist_name:
-                if 'uploader' in info and info['uploader']:
-                    artist_name = info['uploader']
-                elif 'channel' in info and info['channel']:
-                    clean_channel = info['channel'].replace(" - Topic", "").replace("VEVO", "").strip()
-                    if clean_channel:
-                        artist_name = clean_channel
-            
-            # Fallback: try to get artist from first track
-            if not artist_name and info['entries']:
-                # Get info from first available track
-                for entry in info['entries']:
-                    if entry:
-                        # Extract full info for first track
-                        try:
-                            with yt_dlp.YoutubeDL({'quiet': True, 'ignoreerrors': True}) as track_ydl:
-                                first_track_info = track_ydl.extract_info(entry['url'], download=False)
-                                youtube_metadata = self.get_metadata_from_youtube(first_track_info)
-                                potential_artist = youtube_metadata.get('artist', '')
-                                if potential_artist and potential_artist != 'Unknown Artist':
-                                    artist_name = potential_artist
-                                    break
-                        except:
-                            continue
-            
-            if not artist_name:
-                artist_name = 'Various Artists'
-            
-            # Create album folder
-            album_folder = self.sanitize_filename(f"{artist_name}/{album_name}")
-            album_path = os.path.join(self.output_dir, album_folder)
-            self.ensure_dir_exists(album_path)
-            
-            # Base metadata for all tracks
-            base_metadata = {
-                'artist': artist_name,
-                'album': album_name,
-                'year': album_metadata.get('year'),
-                'genre': album_metadata.get('genre')
-            }
-            
-            # Filter out None values
-            base_metadata = {k: v for k, v in base_metadata.items() if v is not None}
-        
-        # Configure yt-dlp options for download with better error handling
-        ydl_opts = {
-            'format': 'bestaudio[ext=m4a]/bestaudio[ext=mp3]/bestaudio/best[height<=720]/best',
-            'postprocessors': [{
-                'key': 'FFmpegExtractAudio',
-                'preferredcodec': 'mp3',
-                'preferredquality': '320',
-            }],
-            'outtmpl': f'{album_path}/%(playlist_index)s - %(title)s.%(ext)s',
-            'quiet': False,
-            'no_warnings': False,
-            'ignoreerrors': True,  # Continue downloading even if some videos fail
-            'extract_flat': False,
-        }
-        
-        # Download the album
-        downloaded_files = []
-        failed_videos = []
-        
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            try:
-                info = ydl.extract_info(url, download=True)
-                
-                # Process each song in the playlist
-                if 'entries' in info:
-                    for idx, entry in enumerate(info['entries'], 1):
-                        if entry is None:
-                            print(f"Track {idx}: Skipped (unavailable)")
-                            failed_videos.append(idx)
-                            continue
-                        
-                        try:
-                            print(f"\nProcessing Track {idx}...")
-                            filename = ydl.prepare_filename(entry).replace('.webm', '.mp3').replace('.m4a', '.mp3')
-                            
-                            # Check if file actually exists
-                            if not os.path.exists(filename):
-                                print(f"Track {idx}: File not found after download, skipping metadata update")
-                                failed_videos.append(idx)
-                                continue
-                            
-                            # Get detailed metadata from YouTube for this track
-                            track_youtube_metadata = self.get_metadata_from_youtube(entry)
-                            
-                            # Combine with base album metadata (base takes precedence for album info)
-                            track_metadata = {**track_youtube_metadata, **base_metadata}
-                            
-                            # Ensure track number is set correctly
-                            track_metadata['track'] = str(idx)
-                            
-                            # If artist is still generic, try to extract better artist info
-                            if track_metadata.get('artist') in ['Unknown Artist', 'Various Artists', None]:
-                                # Try to extract from track title
-                                track_title = entry.get('title', '')
-                                extracted_artist, _ = self.extract_title_artist(track_title)
-                                if extracted_artist and extracted_artist != 'Unknown Artist':
-                                    track_metadata['artist'] = extracted_artist
-                            
-                            # Enrich with MusicBrainz if enabled
-                            print(f"  └─ Searching for additional metadata...")
-                            final_track_metadata = self.enrich_metadata(track_metadata)
-                            
-                            # Update metadata for this track
-                            print(f"  └─ Updating metadata...")
-                            if self.update_metadata(filename, final_track_metadata):
-                                downloaded_files.append(filename)
-                                print(f"✓ Track {idx}: Successfully processed")
-                            else:
-                                print(f"⚠ Track {idx}: Downloaded but failed to update metadata")
-                                downloaded_files.append(filename)
-                        
-                        except Exception as e:
-                            print(f"✗ Track {idx}: Error processing - {str(e)}")
-                            failed_videos.append(idx)
-                            continue
-            
-            except Exception as e:
-                print(f"Error during album download: {e}")
-                if not downloaded_files:
-                    raise
-        
-        # Report results
-        print(f"\nDownload completed!")
-        print(f"Successfully downloaded: {len(downloaded_files)} tracks")
-        if failed_videos:
-            print(f"Failed/skipped tracks: {len(failed_videos)} (positions: {failed_videos})")
-        
-        return album_path
-    
-    def update_metadata(self, file_path, metadata):
-        """Update metadata of an MP3 file including album art."""
-        try:
-            # Check if file exists
-            if not os.path.isfile(file_path):
-                print(f"Error: File not found: {file_path}")
-                return False
-            
-            # Try to create ID3 tags if they don't exist
-            try:
-                audio = ID3(file_path)
-            except:
-                # If ID3 tag doesn't exist, create one
-                audio = ID3()
-            
-            # Update metadata tags
-            if 'title' in metadata:
-                audio['TIT2'] = TIT2(encoding=3, text=metadata['title'])
-                print(f"  └─ Title: {metadata['title']}")
-            
-            if 'artist' in metadata:
-                audio['TPE1'] = TPE1(encoding=3, text=metadata['artist'])
-                audio['TPE2'] = TPE2(encoding=3, text=metadata['artist'])  # Album artist
-                print(f"  └─ Artist: {metadata['artist']}")
-            
-            if 'album' in metadata:
-                audio['TALB'] = TALB(encoding=3, text=metadata['album'])
-                print(f"  └─ Album: {metadata['album']}")
-            
-            if 'track' in metadata:
-                audio['TRCK'] = TRCK(encoding=3, text=metadata['track'])
-                print(f"  └─ Track: {metadata['track']}")
-            
-            if 'year' in metadata:
-                audio['TYER'] = TYER(encoding=3, text=metadata['year'])
-                print(f"  └─ Year: {metadata['year']}")
-            
-            if 'genre' in metadata:
-                audio['TCON'] = TCON(encoding=3, text=metadata['genre'])
-                print(f"  └─ Genre: {metadata['genre']}")
-            
-            # Download and add album art
-            if self.download_album_art and 'album_art_url' in metadata:
-                album_art_data = self.download_album_art(metadata['album_art_url'], file_path)
-                if album_art_data:
-                    # Determine MIME type based on content
-                    mime_type = 'image/jpeg'  # Default
-                    if album_art_data.startswith(b'\x89PNG'):
-                        mime_type = 'image/png'
-                    elif album_art_data.startswith(b'GIF'):
-                        mime_type = 'image/gif'
-                    elif album_art_data.startswith(b'\xff\xd8'):
-                        mime_type = 'image/jpeg'
-                    
-                    # Add album art to ID3 tags
-                    audio['APIC'] = APIC(
-                        encoding=3,  # UTF-8
-                        mime=mime_type,
-                        type=3,  # Cover (front)
-                        desc='Cover',
-                        data=album_art_data
-                    )
-                    print(f"  └─ Album art: Downloaded and embedded")
-                else:
-                    print(f"  └─ Album art: Failed to download")
-            elif not self.download_album_art:
-                print(f"  └─ Album art: Skipped (disabled)")
-            
-            # Save changes
-            audio.save(file_path)
-            print(f"✓ Updated metadata for: {os.path.basename(file_path)}")
-            return True
-            
-        except Exception as e:
-            print(f"Error updating metadata: {e}")
-            return False
-
-def main():
-    parser = argparse.ArgumentParser(description='Download music and update metadata')
-    parser.add_argument('url', nargs='?', help='URL of the song or album to download')
-    parser.add_argument('--output', '-o', default='downloads', help='Output directory')
-    parser.add_argument('--album', help='Album name (optional, auto-detected)')
-    parser.add_argument('--artist', help='Artist name (optional, auto-detected)')
-    parser.add_argument('--title', help='Song title (optional, auto-detected)')
-    parser.add_argument('--year', help='Release year (optional, auto-detected)')
-    parser.add_argument('--genre', help='Music genre (optional, auto-detected)')
-    parser.add_argument('--album-mode', '-a', action='store_true', help='Download as album (forces playlist download)')
-    parser.add_argument('--no-auto-metadata', action='store_true', help='Disable automatic metadata detection')
-    parser.add_argument('--no-album-art', action='store_true', help='Skip downloading album art')
-    parser.add_argument('--list-formats', action='store_true', help='List available formats for the URL (for debugging)')
-    parser.add_argument('--update-ytdlp', action='store_true', help='Update yt-dlp before downloading')
-    
-    args = parser.parse_args()
-    
-    if args.update_ytdlp:
-        print("Updating yt-dlp...")
-        import subprocess
-        try:
-            result = subprocess.run([sys.executable, '-m', 'pip', 'install', '--upgrade', 'yt-dlp'], 
-                                  capture_output=True, text=True)
-            if result.returncode == 0:
-                print("yt-dlp updated successfully!")
-            else:
-                print(f"Failed to update yt-dlp: {result.stderr}")
-        except Exception as e:
-            print(f"Error updating yt-dlp: {e}")
-        return
-    
-    if not args.url:
-        parser.error("URL is required unless using --update-ytdlp")
-    
-    downloader = MusicDownloader(args.output, not args.no_auto_metadata, not args.no_album_art)
-    
-    if args.list_formats:
-        downloader.list_formats(args.url)
-        return
-    
-    metadata = {
-        'artist': args.artist,
-        'album': args.album,
-        'title': args.title,
-        'year': args.year,
-        'genre': args.genre
-    }
-    
-    # Filter out None values
-    metadata = {k: v for k, v in metadata.items() if v is not None}
-    
-    try:
-        if args.album_mode:
-            print(f"Downloading album from: {args.url}")
-            album_path = downloader.download_album(args.url, metadata)
-            if album_path:
-                print(f"Album downloaded to: {album_path}")
-            else:
-                print("Album download failed or was incomplete")
-        else:
-            print(f"Downloading song from: {args.url}")
-            song_path = downloader.download_song(args.url, metadata)
-            if song_path:
-                print(f"Song downloaded to: {song_path}")
-            else:
-                print("Song download failed")
-    except Exception as e:
-        print(f"Download failed with error: {e}")
-        print("\nTroubleshooting steps:")
-        print("1. Update yt-dlp: python MusicDownloader.py --update-ytdlp")
-        print("2. Check available formats: python MusicDownloader.py --list-formats <URL>")
-        print("3. Verify the URL is accessible in your browser")
-        sys.exit(1)
-
-if __name__ == "__main__":
-    main()
+import os
+import sys
+import argparse
+import concurrent.futures
+import functools
+import hashlib
+import re
+import sqlite3
+import threading
+from pathlib import Path
+from urllib.parse import quote
+import time
+
+# yt_dlp, requests and mutagen are imported lazily inside the methods that
+# need them, so --help and control commands don't pay their import cost
+
+try:
+    # RapidFuzz is C++-backed and much faster than difflib on short strings
+    from rapidfuzz import fuzz as _fuzz
+except ImportError:
+    _fuzz = None
+
+try:
+    # orjson parses the nested MusicBrainz responses 2-3x faster than stdlib
+    import orjson
+
+    def _json_loads(data):
+        return orjson.loads(data)
+
+    def _json_dumps(obj):
+        return orjson.dumps(obj)
+except ImportError:
+    import json
+
+    def _json_loads(data):
+        return json.loads(data)
+
+    def _json_dumps(obj):
+        return json.dumps(obj).encode()
+
+def _similarity(a, b):
+    """Return a 0..1 similarity ratio between two strings."""
+    if _fuzz is not None:
+        return _fuzz.WRatio(a, b) / 100.0
+    # autojunk=False: the default heuristic corrupts ratios on repetitive
+    # strings, which are common in track titles
+    from difflib import SequenceMatcher
+    return SequenceMatcher(None, a, b, autojunk=False).ratio()
+
+# Deletion table for filename characters Windows rejects, plus ASCII control
+# characters; str.translate is C-level and beats a regex for this
+_INVALID_CHARS_TABLE = str.maketrans("", "", '\\/*?:"<>|' + ''.join(map(chr, range(32))))
+
+# Precompiled patterns; these run for every track during album downloads
+_TITLE_PATTERNS = [
+    re.compile(r"^(.*?)\s*-\s*(.*?)$"),
+    re.compile(r"^(.*?)\s*–\s*(.*?)$"),
+    re.compile(r"^(.*?)\s*:\s*(.*?)$"),
+]
+_FEAT_RE = re.compile(r'\s+(?:feat\.?|ft\.?)\s+', re.IGNORECASE)
+
+# Album art cache limits: one album shares a handful of URLs, and anything
+# bigger than this is not worth embedding in every track
+_ART_CACHE_MAX_ENTRIES = 16
+_ART_MAX_BYTES = 10 * 1024 * 1024
+
+# Full yt-dlp info dicts run to hundreds of KB each; a batch run over many
+# URLs must not keep them all
+_INFO_CACHE_MAX_ENTRIES = 32
+
+# Magic-byte fallback when the server omits Content-Type; the Cover Art
+# Archive serves webp for some thumbnails
+_ART_SNIFF = {
+    b'\x89PNG': 'image/png',
+    b'GIF8': 'image/gif',
+    b'\xff\xd8': 'image/jpeg',
+    b'RIFF': 'image/webp',
+}
+
+def _default_workers():
+    """Size the worker pool from the usable cores: 2x for I/O overlap, capped at 8."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        # sched_getaffinity is Linux-only
+        cpus = os.cpu_count() or 2
+    return min(8, cpus * 2)
+
+def _list_formats(url):
+    """List available formats for a URL (useful for debugging).
+
+    Free function so --list-formats only needs yt-dlp, not the full
+    downloader with its cache and session state.
+    """
+    try:
+        import yt_dlp
+        with yt_dlp.YoutubeDL({'quiet': True, 'listformats': True}) as ydl:
+            info = ydl.extract_info(url, download=False)
+            if 'formats' in info:
+                print(f"Available formats for {url}:")
+                for fmt in info['formats']:
+                    print(f"  {fmt.get('format_id', 'N/A')} - {fmt.get('ext', 'N/A')} - {fmt.get('format_note', 'N/A')}")
+            else:
+                print("No format information available")
+    except Exception as e:
+        print(f"Error listing formats: {e}")
+
+class _MBCache:
+    """SQLite-backed cache for MusicBrainz and Cover Art Archive lookups.
+
+    Entries older than the TTL are treated as misses so stale metadata
+    eventually refreshes. Safe to use from multiple worker threads.
+    """
+
+    def __init__(self, path, ttl=30 * 86400):
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS recordings (key TEXT PRIMARY KEY, json BLOB, ts INTEGER)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cover_art (release_id TEXT PRIMARY KEY, url TEXT, ts INTEGER)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS tracks (video_id TEXT PRIMARY KEY, json BLOB, ts INTEGER)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS art_blobs (url TEXT PRIMARY KEY, data BLOB, mime TEXT, ts INTEGER)")
+        self._conn.commit()
+
+    def get_recording(self, key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT json, ts FROM recordings WHERE key = ?", (key,)).fetchone()
+        if row is None or time.time() - row[1] > self._ttl:
+            return None
+        return _json_loads(row[0])
+
+    def set_recording(self, key, metadata):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO recordings VALUES (?, ?, ?)",
+                (key, _json_dumps(metadata), int(time.time())))
+            self._conn.commit()
+
+    def get_cover_art(self, release_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT url, ts FROM cover_art WHERE release_id = ?", (release_id,)).fetchone()
+        if row is None or time.time() - row[1] > self._ttl:
+            return None
+        return row[0]
+
+    def set_cover_art(self, release_id, art_url):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cover_art VALUES (?, ?, ?)",
+                (release_id, art_url, int(time.time())))
+            self._conn.commit()
+
+    def get_track(self, video_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT json, ts FROM tracks WHERE video_id = ?", (video_id,)).fetchone()
+        if row is None or time.time() - row[1] > self._ttl:
+            return None
+        return _json_loads(row[0])
+
+    def set_track(self, video_id, metadata):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO tracks VALUES (?, ?, ?)",
+                (video_id, _json_dumps(metadata), int(time.time())))
+            self._conn.commit()
+
+    def get_art(self, url):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data, mime, ts FROM art_blobs WHERE url = ?", (url,)).fetchone()
+        if row is None or time.time() - row[2] > self._ttl:
+            return None
+        return row[0], row[1]
+
+    def set_art(self, url, data, mime):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO art_blobs VALUES (?, ?, ?, ?)",
+                (url, data, mime, int(time.time())))
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            for table in ('recordings', 'cover_art', 'tracks', 'art_blobs'):
+                self._conn.execute(f"DELETE FROM {table}")
+            self._conn.commit()
+
+class MusicDownloader:
+    def __init__(self, output_dir="downloads", auto_metadata=True, download_album_art=True, max_workers=None,
+                 use_cache=True, json_events=False):
+        """Initialize the music downloader with the output directory."""
+        self.output_dir = output_dir
+        self.auto_metadata = auto_metadata
+        # Plain bool; no method may share this name or attribute lookups on
+        # the instance would shadow it (which used to break art downloads)
+        self.download_album_art = download_album_art
+        # Worker threads for per-track processing, sized to the machine by default
+        self.max_workers = max_workers if max_workers else _default_workers()
+        self._mb_cache = {}  # In-process front for the on-disk MusicBrainz cache
+        self._mb_lock = threading.Lock()  # Serializes MusicBrainz pacing across workers
+        self._mb_last_request = 0.0  # monotonic timestamp of the last MB-family request
+        self._info_cache = {}  # Recent yt-dlp info dicts keyed by URL, oldest evicted at the cap
+        self._created_dirs = set()  # Directories already ensured, to skip syscalls
+        self._yt_metadata_cache = {}  # Parsed YouTube metadata keyed by video id
+        self._art_cache = {}  # Album art bytes keyed by URL, shared across an album
+        self._frame_cache = {}  # Built ID3 frames for album-shared values (artist/album/art...)
+        self.json_events = json_events  # Emit JSON event lines for orchestrators
+        self._session = None  # Pooled HTTP session for all outbound fetches, built on first use
+        self._ydl = None  # Shared YoutubeDL for serial song downloads, built on first use
+        self._ydl_final_paths = []  # Paths the shared instance's postprocessor hook reports
+        self.ensure_dir_exists(output_dir)
+        # On-disk cache; None when the user opts out with --no-cache
+        self._mb_disk_cache = (
+            _MBCache(os.path.join(output_dir, '.mb_cache.sqlite')) if use_cache else None)
+        self.check_ytdlp_version()
+
+    def _get_session(self):
+        """Build the pooled HTTP session on first use.
+
+        One keep-alive session serves MusicBrainz, the Cover Art Archive,
+        and album art downloads, avoiding a TLS handshake per request.
+        Retries with backoff honour Retry-After on 429/503 rate-limit
+        responses instead of returning empty metadata.
+        """
+        if self._session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            from urllib3.util.retry import Retry
+
+            session = requests.Session()
+            session.headers.update({
+                "User-Agent": "MusicDownloader/1.0 (your@email.com)",  # Required by MusicBrainz
+            })
+            session.mount("https://", HTTPAdapter(
+                pool_connections=16,
+                pool_maxsize=32,
+                max_retries=Retry(total=3, backoff_factor=0.5,
+                                  status_forcelist=[429, 503],
+                                  respect_retry_after_header=True)
+            ))
+            self._session = session
+        return self._session
+
+    def _emit_event(self, status, **fields):
+        """Print one JSON event line (started/done/error) in --json mode.
+
+        Stdlib json rather than _json_dumps: events must be text lines, and
+        they are far off the hot path.
+        """
+        if not self.json_events:
+            return
+        import json
+        # Events go to the real stdout; main() moves human output to stderr
+        # in --json mode so this stream stays machine-parseable
+        print(json.dumps({'status': status, **fields}), file=sys.__stdout__, flush=True)
+
+    def _ydl_instance(self):
+        """Build the shared YoutubeDL for single-song downloads on first use.
+
+        Construction loads every extractor class, so batches of serial
+        downloads reuse one instance; the output template is re-pointed per
+        call through ydl.params. Not shared with album workers, which need
+        a YoutubeDL per thread.
+        """
+        if self._ydl is None:
+            import yt_dlp
+
+            def _capture_final_path(d):
+                if d['status'] == 'finished':
+                    filepath = d.get('info_dict', {}).get('filepath')
+                    if filepath:
+                        self._ydl_final_paths.append(filepath)
+
+            self._ydl = yt_dlp.YoutubeDL({
+                'format': 'bestaudio[ext=m4a]/bestaudio[ext=mp3]/bestaudio/best[height<=720]/best',
+                'postprocessors': [{
+                    'key': 'FFmpegExtractAudio',
+                    'preferredcodec': 'mp3',
+                    'preferredquality': '320',
+                }, {
+                    # Write the basic tags during the same FFmpeg pass; mutagen
+                    # afterwards only has to add album art and extra frames
+                    'key': 'FFmpegMetadata',
+                    'add_metadata': True,
+                }],
+                # In --json mode yt-dlp must not write to stdout
+                'quiet': self.json_events,
+                'no_warnings': self.json_events,
+                'noprogress': self.json_events,
+                'ignoreerrors': False,
+                'extract_flat': False,
+                # Fetch HLS/DASH fragments in parallel and use large HTTP chunks
+                'concurrent_fragment_downloads': 4,
+                'http_chunk_size': 10485760,
+                # Capture the actual output path from the postprocessor chain
+                # rather than guessing the extension afterwards
+                'postprocessor_hooks': [_capture_final_path],
+            })
+        return self._ydl
+
+    def _mb_throttle(self, min_interval=1.05):
+        """Pace MusicBrainz-family requests to at most one per min_interval.
+
+        Unlike a fixed sleep, this only waits for however much of the
+        interval is left since the previous request (1.05s leaves a safety
+        margin over MusicBrainz's 1 req/s rule). Shared by all workers.
+        """
+        with self._mb_lock:
+            wait = min_interval - (time.monotonic() - self._mb_last_request)
+            if wait > 0:
+                time.sleep(wait)
+            self._mb_last_request = time.monotonic()
+
+    def ensure_dir_exists(self, directory):
+        """Create directory if it doesn't exist."""
+        directory = str(directory)
+        if directory in self._created_dirs:
+            return
+        path = Path(directory)
+        existed = path.is_dir()
+        # exist_ok makes this race-safe when enrichment workers share a folder
+        path.mkdir(parents=True, exist_ok=True)
+        self._created_dirs.add(directory)
+        if not existed:
+            print(f"Created directory: {directory}")
+    
+    def check_ytdlp_version(self):
+        """Check yt-dlp version and provide update information if needed."""
+        try:
+            import yt_dlp
+            version = yt_dlp.version.__version__
+            print(f"Using yt-dlp version: {version}")
+            
+            # If we encounter errors, this will be helpful information
+            if hasattr(yt_dlp, '__version__'):
+                print(f"Full version info: {yt_dlp.__version__}")
+                
+        except Exception as e:
+            print(f"Could not determine yt-dlp version: {e}")
+            print("Consider updating yt-dlp with: pip install --upgrade yt-dlp")
+    
+    def _cached_extract_info(self, ydl, url):
+        """Extract info for a URL once per session, reusing the cached dict."""
+        info = self._info_cache.get(url)
+        if info is None:
+            info = ydl.extract_info(url, download=False)
+            if info is not None:
+                if len(self._info_cache) >= _INFO_CACHE_MAX_ENTRIES:
+                    # Evict the oldest entry: repeat URLs land close together,
+                    # so a long batch run doesn't pile up stale info dicts
+                    self._info_cache.pop(next(iter(self._info_cache)))
+                self._info_cache[url] = info
+        # Hand out a copy so download processing doesn't mutate the cache
+        return dict(info) if info is not None else None
+
+    def list_formats(self, url):
+        """List available formats for a URL (useful for debugging)."""
+        _list_formats(url)
+    
+    @staticmethod
+    @functools.lru_cache(maxsize=1024)
+    def sanitize_filename(filename):
+        """Remove invalid characters from filename.
+
+        Memoized: artist and album names repeat for every track of an album.
+        """
+        return filename.translate(_INVALID_CHARS_TABLE)
+
+    @staticmethod
+    @functools.lru_cache(maxsize=1024)
+    def extract_title_artist(title):
+        """Extract artist and title from YouTube title format.
+
+        Pure string parsing, so results are memoized; concurrent enrichment
+        workers often parse the same title repeatedly.
+        """
+        # Common patterns: "Artist - Title", "Artist – Title", "Artist: Title"
+        for pattern in _TITLE_PATTERNS:
+            match = pattern.match(title)
+            if match:
+                artist = match.group(1).strip()
+                title = match.group(2).strip()
+                return artist, title
+
+        # No match found, try to find featuring artists with a single scan
+        match = _FEAT_RE.search(title)
+        if match:
+            artist = title[:match.start()].strip()
+            featured = title[match.end():].strip()
+            return artist, f"{artist} feat. {featured}"
+
+        # If nothing matches, return original as title and Unknown as artist
+        return "Unknown Artist", title
+    
+    def search_musicbrainz(self, title, artist=None):
+        """Search MusicBrainz API for metadata."""
+        # Collapse trivial case/whitespace variants so repeated queries hit the cache
+        cache_key = (title.lower().strip(), (artist or "").lower().strip())
+        if cache_key in self._mb_cache:
+            return dict(self._mb_cache[cache_key])
+
+        # Then the on-disk cache, which survives across runs
+        disk_key = hashlib.sha1(f"{cache_key[1]}|{cache_key[0]}".encode()).hexdigest()
+        if self._mb_disk_cache is not None:
+            cached = self._mb_disk_cache.get_recording(disk_key)
+            if cached is not None:
+                self._mb_cache[cache_key] = cached
+                return dict(cached)
+
+        try:
+            # Fielded Lucene query; MusicBrainz ranks results server-side,
+            # so a small limit is enough and no client-side rescoring is needed.
+            # Embedded quotes would break the phrase syntax, so strip them.
+            query = 'recording:"{}"'.format(title.replace('"', ''))
+            if artist:
+                query += ' AND artist:"{}"'.format(artist.replace('"', ''))
+
+            url = f"https://musicbrainz.org/ws/2/recording/?query={quote(query)}&fmt=json&limit=3&inc=releases+release-groups+artist-credits+tags"
+
+            # Respect MusicBrainz rate limiting across all enrichment workers
+            self._mb_throttle()
+            response = self._get_session().get(url, timeout=(3.05, 10))
+            if response.status_code != 200:
+                # Transient failure: don't poison the 30-day negative cache
+                return {}
+            data = _json_loads(response.content)
+            if "recordings" in data and len(data["recordings"]) > 0:
+                # Take the first candidate with a high server-side score that
+                # also passes a cheap title sanity check
+                best_match = None
+                for recording in data["recordings"]:
+                    rec_title = recording.get("title", "")
+                    if int(recording.get("score", 0)) >= 90 and _similarity(title.lower(), rec_title.lower()) > 0.7:
+                        best_match = recording
+                        break
+
+                if best_match:
+                    metadata = {
+                        "title": best_match.get("title"),
+                        "artist": None,
+                        "album": None,
+                        "year": None,
+                        "genre": None,
+                        "track": None,
+                        "album_art_url": None
+                    }
+                    
+                    # Get artist information
+                    if best_match.get("artist-credit"):
+                        artists = []
+                        for artist_credit in best_match["artist-credit"]:
+                            if isinstance(artist_credit, dict) and "artist" in artist_credit:
+                                artists.append(artist_credit["artist"]["name"])
+                            elif isinstance(artist_credit, dict) and "name" in artist_credit:
+                                artists.append(artist_credit["name"])
+                        if artists:
+                            metadata["artist"] = ", ".join(artists)
+                    
+                    # Get genre from tags
+                    if "tags" in best_match and best_match["tags"]:
+                        # Get the most popular tag as genre
+                        sorted_tags = sorted(best_match["tags"], key=lambda x: x.get("count", 0), reverse=True)
+                        if sorted_tags:
+                            metadata["genre"] = sorted_tags[0]["name"]
+                    
+                    # Try to get album info and cover art
+                    if "releases" in best_match and len(best_match["releases"]) > 0:
+                        release = best_match["releases"][0]
+                        metadata["album"] = release.get("title")
+                        
+                        if "date" in release:
+                            metadata["year"] = release["date"][:4] if release["date"] else None
+                        
+                        # Get track number from release
+                        if "track-number" in release:
+                            metadata["track"] = release["track-number"]
+                        
+                        # Try to get cover art from Cover Art Archive
+                        release_id = release.get("id")
+                        if release_id:
+                            cover_art_url = self.get_cover_art_url(release_id)
+                            if cover_art_url:
+                                metadata["album_art_url"] = cover_art_url
+                    
+                    # Filter out None values
+                    metadata = {k: v for k, v in metadata.items() if v is not None}
+                    self._mb_cache[cache_key] = metadata
+                    if self._mb_disk_cache is not None:
+                        self._mb_disk_cache.set_recording(disk_key, metadata)
+                    return dict(metadata)
+
+            # Cache misses too, so repeated lookups for unmatched tracks stay offline
+            self._mb_cache[cache_key] = {}
+            if self._mb_disk_cache is not None:
+                self._mb_disk_cache.set_recording(disk_key, {})
+            return {}
+        except Exception as e:
+            print(f"Error fetching metadata from MusicBrainz: {e}")
+            return {}
+    
+    def search_musicbrainz_release(self, album, artist=None):
+        """Look up an album release on MusicBrainz and map its tracks.
+
+        One release search plus one track-listing lookup replaces a
+        per-track recording query for every song of an album. Returns a
+        dict of {track_position: metadata}, empty when nothing matched.
+        """
+        if not album:
+            return {}
+
+        try:
+            # Fielded Lucene query, same shape as the recording search
+            query = 'release:"{}"'.format(album.replace('"', ''))
+            if artist:
+                query += ' AND artist:"{}"'.format(artist.replace('"', ''))
+
+            url = f"https://musicbrainz.org/ws/2/release/?query={quote(query)}&fmt=json&limit=5"
+            self._mb_throttle()
+            response = self._get_session().get(url, timeout=(3.05, 10))
+            if response.status_code != 200:
+                return {}
+
+            releases = _json_loads(response.content).get("releases", [])
+            if not releases or int(releases[0].get("score", 0)) < 90:
+                return {}
+            release_id = releases[0].get("id")
+            if not release_id:
+                return {}
+
+            # Search results don't carry track listings; one lookup does
+            lookup_url = f"https://musicbrainz.org/ws/2/release/{release_id}?fmt=json&inc=recordings+artist-credits"
+            self._mb_throttle()
+            response = self._get_session().get(lookup_url, timeout=(3.05, 10))
+            if response.status_code != 200:
+                return {}
+            release = _json_loads(response.content)
+
+            album_title = release.get("title")
+            year = (release.get("date") or "")[:4] or None
+
+            release_artist = None
+            if release.get("artist-credit"):
+                names = [credit.get("name") for credit in release["artist-credit"]
+                         if isinstance(credit, dict) and credit.get("name")]
+                if names:
+                    release_artist = ", ".join(names)
+
+            album_art_url = None
+            if self.download_album_art:
+                album_art_url = self.get_cover_art_url(release_id)
+
+            tracks = {}
+            # Positions restart at 1 on every medium, so carry an offset
+            # across discs; playlist indices run straight through the album
+            offset = 0
+            for medium in release.get("media", []):
+                medium_tracks = medium.get("tracks", [])
+                for track in medium_tracks:
+                    position = track.get("position")
+                    if position is None:
+                        continue
+                    overall = offset + int(position)
+                    track_metadata = {
+                        "title": track.get("title"),
+                        "artist": release_artist,
+                        "album": album_title,
+                        "year": year,
+                        "track": str(overall),
+                        "album_art_url": album_art_url,
+                    }
+                    tracks[overall] = {k: v for k, v in track_metadata.items() if v is not None}
+                offset += medium.get("track-count", len(medium_tracks))
+            return tracks
+
+        except Exception as e:
+            print(f"Error fetching release metadata from MusicBrainz: {e}")
+            return {}
+
+    def get_cover_art_url(self, release_id):
+        """Get cover art URL from MusicBrainz Cover Art Archive."""
+        if self._mb_disk_cache is not None:
+            cached = self._mb_disk_cache.get_cover_art(release_id)
+            if cached is not None:
+                return cached
+
+        try:
+            url = f"https://coverartarchive.org/release/{release_id}"
+            # The Cover Art Archive shares MusicBrainz's pacing bucket
+            self._mb_throttle(min_interval=0.5)
+            response = self._get_session().get(url, timeout=(3.05, 30))
+            if response.status_code == 200:
+                data = _json_loads(response.content)
+                images = data.get("images", [])
+                if images:
+                    # Prefer the front cover; fall back to the first image
+                    # when the release has no designated front
+                    has_front = any(img.get("front") for img in images)
+                    for image in images:
+                        if image.get("front") or not has_front:
+                            # Prefer the 500px thumbnail: plenty for embedded
+                            # art, and far smaller than the original upload
+                            thumbnails = image.get("thumbnails", {})
+                            art_url = (thumbnails.get("500")
+                                       or thumbnails.get("large")
+                                       or image.get("image"))
+                            if art_url:
+                                if self._mb_disk_cache is not None:
+                                    self._mb_disk_cache.set_cover_art(release_id, art_url)
+                            return art_url
+            return None
+        except Exception as e:
+            print(f"Error fetching cover art: {e}")
+            return None
+    
+    def _fetch_album_art(self, url):
+        """Download album art and return (image bytes, MIME type).
+
+        Every track of an album points at the same cover URL, so the result
+        is cached per URL for the session. The MIME type comes from the
+        Content-Type response header, falling back to magic-byte sniffing.
+        (Also renamed from download_album_art, which collided with the
+        constructor flag of the same name and made the art-fetch call crash
+        on the bool.)
+        """
+        cached = self._art_cache.get(url)
+        if cached is not None:
+            return cached
+
+        # Art bytes from a previous run survive in the on-disk cache
+        if self._mb_disk_cache is not None:
+            stored = self._mb_disk_cache.get_art(url)
+            if stored is not None:
+                self._art_cache[url] = stored
+                return stored
+
+        try:
+            with self._get_session().get(url, stream=True, timeout=(3.05, 30)) as response:
+                if response.status_code != 200:
+                    return None
+                mime_type = response.headers.get('Content-Type', '').split(';')[0].strip()
+                chunks = []
+                read = 0
+                for chunk in response.iter_content(chunk_size=65536):
+                    read += len(chunk)
+                    if read > _ART_MAX_BYTES:
+                        print("Album art too large, skipping")
+                        return None
+                    chunks.append(chunk)
+                data = b"".join(chunks)
+
+            if not mime_type.startswith('image/'):
+                mime_type = next(
+                    (mime for magic, mime in _ART_SNIFF.items() if data.startswith(magic)),
+                    'image/jpeg')
+
+            if len(self._art_cache) >= _ART_CACHE_MAX_ENTRIES:
+                # Drop the oldest entry; only the current album's art is hot
+                self._art_cache.pop(next(iter(self._art_cache)))
+            self._art_cache[url] = (data, mime_type)
+            if self._mb_disk_cache is not None:
+                self._mb_disk_cache.set_art(url, data, mime_type)
+            return data, mime_type
+        except Exception as e:
+            print(f"Error downloading album art: {e}")
+            return None
+    
+    def get_metadata_from_youtube(self, info):
+        """Extract metadata from YouTube info."""
+        # The same video is parsed several times in album mode (artist
+        # fallback probe, progress hook, tagging pass); reuse earlier results
+        video_id = info.get('id')
+        if video_id and video_id in self._yt_metadata_cache:
+            return dict(self._yt_metadata_cache[video_id])
+
+        title = info.get('title', '')
+        artist, extracted_title = self.extract_title_artist(title)
+        
+        metadata = {
+            'title': extracted_title,
+            'artist': artist,
+        }
+        
+        # Try to get album from YouTube info
+        if 'album' in info:
+            metadata['album'] = info['album']
+        
+        # Prefer yt-dlp's dedicated music fields (populated for YouTube Music)
+        if 'album_artist' in info and info['album_artist']:
+            if artist == "Unknown Artist":
+                metadata['artist'] = info['album_artist']
+
+        # Try to get artist from YouTube info (channel name, uploader, etc.)
+        if 'uploader' in info and info['uploader']:
+            # Use uploader as artist if we couldn't extract from title
+            if artist == "Unknown Artist":
+                metadata['artist'] = info['uploader']
+        
+        if 'channel' in info and info['channel']:
+            # Use channel name as artist if available and more reliable
+            if artist == "Unknown Artist" or "Topic" in info['channel']:
+                clean_channel = info['channel'].replace(" - Topic", "").replace("VEVO", "").strip()
+                if clean_channel:
+                    metadata['artist'] = clean_channel
+        
+        # Try to get track number
+        if 'track' in info:
+            metadata['track'] = info['track']
+        elif 'playlist_index' in info:
+            metadata['track'] = str(info['playlist_index'])
+        
+        # Try to get release year, falling back to the upload date
+        if 'release_year' in info and info['release_year']:
+            metadata['year'] = str(info['release_year'])
+        elif 'upload_date' in info:
+            metadata['year'] = info['upload_date'][:4]  # First 4 chars should be year
+        
+        # Try to get genre from YouTube info
+        if 'genre' in info:
+            if isinstance(info['genre'], list) and info['genre']:
+                metadata['genre'] = info['genre'][0]
+            elif isinstance(info['genre'], str):
+                metadata['genre'] = info['genre']
+        
+        # Try to get categories as genre fallback
+        if 'categories' in info and info['categories'] and 'genre' not in metadata:
+            if isinstance(info['categories'], list) and info['categories']:
+                # Filter out generic categories
+                categories = [cat for cat in info['categories'] if cat.lower() not in ['music', 'entertainment']]
+                if categories:
+                    metadata['genre'] = categories[0]
+        
+        # Try to get thumbnail for album art
+        if 'thumbnail' in info:
+            metadata['album_art_url'] = info['thumbnail']
+        elif 'thumbnails' in info and info['thumbnails']:
+            # Get the highest quality thumbnail
+            thumbnails = sorted(info['thumbnails'], key=lambda x: x.get('width', 0) * x.get('height', 0), reverse=True)
+            if thumbnails:
+                metadata['album_art_url'] = thumbnails[0]['url']
+
+        if video_id:
+            self._yt_metadata_cache[video_id] = dict(metadata)
+        return metadata
+    
+    def enrich_metadata(self, basic_metadata, info=None):
+        """Enrich metadata with MusicBrainz if possible.
+
+        When the yt-dlp info dict is supplied and points at an official
+        " - Topic" auto-channel, the label-provided artist/album fields are
+        authoritative and the MusicBrainz round-trip is skipped.
+        """
+        if not self.auto_metadata:
+            return basic_metadata
+
+        # If YouTube already supplied the core fields (common for YouTube
+        # Music URLs), skip the MusicBrainz round-trip entirely
+        if all(basic_metadata.get(k) for k in ('title', 'artist', 'album', 'year')):
+            return basic_metadata
+
+        if (info is not None
+                and info.get('channel', '').endswith(' - Topic')
+                and basic_metadata.get('artist') and basic_metadata.get('album')):
+            return basic_metadata
+
+        title = basic_metadata.get('title')
+        artist = basic_metadata.get('artist')
+        
+        if title:
+            mb_metadata = self.search_musicbrainz(title, artist)
+            # Merge metadata, prioritizing MusicBrainz but keeping YouTube data as fallback
+            for key, value in mb_metadata.items():
+                basic_metadata[key] = value
+        
+        return basic_metadata
+    
+    def download_song(self, url, metadata=None):
+        """Download a single song and update its metadata."""
+        if metadata is None:
+            metadata = {}
+        self._emit_event('started', url=url)
+
+        # Extract info once, then reuse it for the download itself so yt-dlp
+        # doesn't repeat the network fetch and JS-player resolution
+        try:
+            ydl = self._ydl_instance()
+            final_paths = self._ydl_final_paths
+            final_paths.clear()
+            try:
+                info = self._cached_extract_info(ydl, url)
+            except Exception as e:
+                print(f"Error extracting video info: {e}")
+                info = None
+
+            if info is not None:
+                # Get metadata from YouTube
+                youtube_metadata = self.get_metadata_from_youtube(info)
+
+                # Merge with user-provided metadata, user's takes precedence
+                combined_metadata = {**youtube_metadata, **metadata}
+
+                # A previous run may have fully resolved this video already
+                cached_track = None
+                if self._mb_disk_cache is not None and self.auto_metadata and info.get('id'):
+                    cached_track = self._mb_disk_cache.get_track(info['id'])
+
+                if cached_track:
+                    final_metadata = {**cached_track, **metadata}
+                else:
+                    # Enrich with MusicBrainz if enabled
+                    final_metadata = self.enrich_metadata(combined_metadata, info)
+                    if self._mb_disk_cache is not None and self.auto_metadata and info.get('id'):
+                        self._mb_disk_cache.set_track(info['id'], final_metadata)
+
+                # Get artist and title for folder name
+                artist = final_metadata.get('artist', 'Unknown Artist')
+                album = final_metadata.get('album', 'Single')
+
+                # For singles, create artist folder with song file; each
+                # path component is sanitized separately so separators
+                # never end up inside a folder name
+                if album == 'Single' or not album:
+                    output_path = Path(self.output_dir) / self.sanitize_filename(artist)
+                else:
+                    # For album tracks, create artist/album folder
+                    output_path = Path(self.output_dir) / self.sanitize_filename(artist) / self.sanitize_filename(album)
+            else:
+                # Use basic metadata if info extraction fails
+                final_metadata = metadata if metadata else {'title': 'Unknown Title', 'artist': 'Unknown Artist'}
+                output_path = Path(self.output_dir) / 'Unknown Artist'
+
+            self.ensure_dir_exists(output_path)
+
+            # Update download options with path
+            ydl.params['outtmpl'] = {'default': str(output_path / '%(title)s.%(ext)s')}
+
+            if info is not None:
+                final_metadata['youtube_id'] = info.get('id', '')
+
+                # Skip the download (and transcode) when a previous run
+                # already produced this file
+                expected = str(Path(ydl.prepare_filename(info)).with_suffix('.mp3'))
+                if self._already_have(expected, info.get('id')):
+                    print(f"Already downloaded, skipping: {expected}")
+                    self._emit_event('done', url=url, path=expected, cached=True)
+                    return expected
+
+                # Expose the enriched metadata through the fields the
+                # FFmpegMetadata postprocessor reads, so the transcode pass
+                # tags the file in the same sweep
+                if final_metadata.get('title'):
+                    info['track'] = final_metadata['title']
+                if final_metadata.get('artist'):
+                    info['artist'] = final_metadata['artist']
+                if final_metadata.get('album'):
+                    info['album'] = final_metadata['album']
+                if final_metadata.get('genre'):
+                    info['genre'] = final_metadata['genre']
+                if final_metadata.get('track'):
+                    info['track_number'] = final_metadata['track']
+
+                # Reuse the already-extracted info for the download
+                info = ydl.process_ie_result(info, download=True)
+            else:
+                info = ydl.extract_info(url, download=True)
+            # Prefer the path reported by the postprocessor hook; fall
+            # back to swapping the suffix (FFmpegExtractAudio always
+            # emits .mp3 regardless of the source container)
+            if final_paths:
+                downloaded_file = final_paths[-1]
+            else:
+                downloaded_file = str(Path(ydl.prepare_filename(info)).with_suffix('.mp3'))
+
+            # Update metadata
+            if os.path.exists(downloaded_file):
+                self.update_metadata(downloaded_file, final_metadata)
+                print(f"Downloaded with metadata: {final_metadata}")
+                self._emit_event('done', url=url, path=downloaded_file)
+                return downloaded_file
+            else:
+                print(f"Warning: Downloaded file not found at expected location: {downloaded_file}")
+                self._emit_event('error', url=url, error='file not found after download')
+                return None
+                
+        except Exception as e:
+            print(f"Error downloading video: {e}")
+            print("This might be due to:")
+            print("1. Video being unavailable or private")
+            print("2. Geographic restrictions")
+            print("3. YouTube format changes")
+            print("4. Network issues")
+            print("\nSuggestions:")
+            print("- Try updating yt-dlp: pip install --upgrade yt-dlp")
+            print("- Check if the video is accessible in your browser")
+            print("- Try a different video URL")
+            self._emit_event('error', url=url, error=str(e))
+            return None
+    
+    def download_album(self, url, album_metadata=None):
+        """Download an album (playlist) and update metadata for all songs."""
+        import yt_dlp
+
+        if album_metadata is None:
+            album_metadata = {}
+        
+        # Configure yt-dlp options for info extraction with error handling
+        info_opts = {
+            'quiet': True,
+            'extract_flat': True,  # Only extract basic info first
+            'ignoreerrors': True,  # Continue even if some videos fail
+        }
+        
+        with yt_dlp.YoutubeDL(info_opts) as ydl:
+            try:
+                info = ydl.extract_info(url, download=False)
+            except Exception as e:
+                print(f"Error extracting playlist info: {e}")
+                print("Trying to download as single song instead...")
+                return self.download_song(url, album_metadata)
+            
+            # Check if this is a playlist
+            if 'entries' not in info:
+                print("The URL does not appear to be a playlist. Downloading as single song instead.")
+                return self.download_song(url, album_metadata)
+            
+            # Try to get album name from playlist title
+            playlist_title = info.get('title', 'Unknown Album')
+            
+            # If user provided album name, use that instead
+            album_name = album_metadata.get('album', playlist_title)
+            
+            # Try to get artist from multiple sources
+            artist_name = album_metadata.get('artist')
+            
+            # Try to extract artist from playlist uploader/channel
+            if not artist_name:
+                if 'uploader' in info and info['uploader']:
+                    artist_name = info['uploader']
+                elif 'channel' in info and info['channel']:
+                    clean_channel = info['channel'].replace(" - Topic", "").replace("VEVO", "").strip()
+                    if clean_channel:
+                        artist_name = clean_channel
+            
+            # Fallback: parse artist from the flat entry titles — pure string
+            # work, no extra YouTube fetches per entry
+            if not artist_name and info['entries']:
+                for entry in info['entries']:
+                    if entry:
+                        potential_artist = self.extract_title_artist(entry.get('title', ''))[0]
+                        if potential_artist and potential_artist != 'Unknown Artist':
+                            artist_name = potential_artist
+                            break
+
+            # Last resort: one full extraction of the first available track
+            if not artist_name and info['entries']:
+                for entry in info['entries']:
+                    if entry:
+                        try:
+                            with yt_dlp.YoutubeDL({'quiet': True, 'ignoreerrors': True}) as track_ydl:
+                                first_track_info = track_ydl.extract_info(entry['url'], download=False)
+                                youtube_metadata = self.get_metadata_from_youtube(first_track_info)
+                                potential_artist = youtube_metadata.get('artist', '')
+                                if potential_artist and potential_artist != 'Unknown Artist':
+                                    artist_name = potential_artist
+                        except:
+                            pass
+                        break
+            
+            if not artist_name:
+                artist_name = 'Various Artists'
+            
+            # Create album folder, sanitizing artist and album separately so
+            # separators can't collapse the two components into one name
+            album_path = Path(self.output_dir) / self.sanitize_filename(artist_name) / self.sanitize_filename(album_name)
+            self.ensure_dir_exists(album_path)
+            
+            # Base metadata for all tracks
+            base_metadata = {
+                'artist': artist_name,
+                'album': album_name,
+                'year': album_metadata.get('year'),
+                'genre': album_metadata.get('genre')
+            }
+            
+            # Filter out None values
+            base_metadata = {k: v for k, v in base_metadata.items() if v is not None}
+
+            # One release-level MusicBrainz lookup covers most of the album,
+            # leaving per-track recording queries as the fallback only
+            release_tracks = {}
+            if self.auto_metadata:
+                release_tracks = self.search_musicbrainz_release(
+                    album_name, None if artist_name == 'Various Artists' else artist_name)
+                if release_tracks:
+                    print(f"Found release metadata on MusicBrainz for {len(release_tracks)} tracks")
+        
+        # Shared download options; each worker builds its own YoutubeDL with
+        # a per-track output template, since the flat entries are downloaded
+        # individually rather than through one playlist run
+        ydl_opts = {
+            'format': 'bestaudio[ext=m4a]/bestaudio[ext=mp3]/bestaudio/best[height<=720]/best',
+            'postprocessors': [{
+                'key': 'FFmpegExtractAudio',
+                'preferredcodec': 'mp3',
+                'preferredquality': '320',
+            }],
+            # In --json mode yt-dlp must not write to stdout
+            'quiet': self.json_events,
+            'no_warnings': self.json_events,
+            'noprogress': self.json_events,
+            'ignoreerrors': True,  # Continue downloading even if some videos fail
+            'extract_flat': False,
+            # Fetch HLS/DASH fragments in parallel and use large HTTP chunks
+            'concurrent_fragment_downloads': 4,
+            'http_chunk_size': 10485760,
+        }
+
+        downloaded_files = []
+        failed_videos = []
+
+        # Number the flat entries by playlist position up front
+        entries = []
+        for idx, entry in enumerate(info['entries'], 1):
+            if entry is None:
+                print(f"Track {idx}: Skipped (unavailable)")
+                failed_videos.append(idx)
+            else:
+                entries.append((idx, entry))
+
+        def _download_track(idx, entry):
+            """Download, enrich and tag one track; runs on a worker thread."""
+            final_paths = []
+
+            def _capture_final_path(d):
+                if d['status'] == 'finished':
+                    filepath = (d.get('info_dict') or {}).get('filepath')
+                    if filepath:
+                        final_paths.append(filepath)
+
+            opts = dict(ydl_opts)
+            opts['outtmpl'] = str(album_path / f'{idx} - %(title)s.%(ext)s')
+            opts['postprocessor_hooks'] = [_capture_final_path]
+            track_url = entry.get('url') or entry.get('webpage_url')
+            self._emit_event('started', url=track_url, track=idx)
+            try:
+                with yt_dlp.YoutubeDL(opts) as track_ydl:
+                    track_info = track_ydl.extract_info(track_url, download=True)
+                    if track_info is None:
+                        print(f"Track {idx}: Skipped (unavailable)")
+                        self._emit_event('error', url=track_url, track=idx, error='unavailable')
+                        return idx, None, False
+                    # Prefer the path the postprocessor chain reported
+                    if final_paths:
+                        filename = final_paths[-1]
+                    else:
+                        filename = str(Path(track_ydl.prepare_filename(track_info)).with_suffix('.mp3'))
+
+                if not os.path.exists(filename):
+                    print(f"Track {idx}: File not found after download, skipping metadata update")
+                    self._emit_event('error', url=track_url, track=idx,
+                                     error='file not found after download')
+                    return idx, None, False
+
+                result = self._process_track(idx, filename, track_info,
+                                             base_metadata, release_tracks)
+                if result[2] and result[1]:
+                    self._emit_event('done', url=track_url, track=idx, path=result[1])
+                else:
+                    self._emit_event('error', url=track_url, track=idx,
+                                     error='processing failed')
+                return result
+            except Exception as e:
+                print(f"Track {idx}: Error during download: {e}")
+                self._emit_event('error', url=track_url, track=idx, error=str(e))
+                return idx, None, False
+
+        # Tracks spend most of their time on socket reads and the ffmpeg
+        # transcode, so download them in parallel; enrichment and tagging
+        # happen on the same worker as soon as its track lands
+        try:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                futures = [executor.submit(_download_track, idx, entry)
+                           for idx, entry in entries]
+                results = [f.result() for f in concurrent.futures.as_completed(futures)]
+
+            # Restore playlist order regardless of completion order
+            for idx, filename, success in sorted(results):
+                if filename:
+                    downloaded_files.append(filename)
+                else:
+                    failed_videos.append(idx)
+
+        except Exception as e:
+            print(f"Error during album download: {e}")
+            if not downloaded_files:
+                raise
+        
+        # Report results
+        print(f"\nDownload completed!")
+        print(f"Successfully downloaded: {len(downloaded_files)} tracks")
+        if failed_videos:
+            print(f"Failed/skipped tracks: {len(failed_videos)} (positions: {failed_videos})")
+        
+        return album_path
+
+    def _build_track_metadata(self, entry, base_metadata, idx):
+        """Combine YouTube metadata for one album track with the album base."""
+        track_youtube_metadata = self.get_metadata_from_youtube(entry)
+
+        # Combine with base album metadata (base takes precedence for album info)
+        track_metadata = {**track_youtube_metadata, **base_metadata}
+
+        # Ensure track number is set correctly
+        track_metadata['track'] = str(idx)
+
+        # If artist is still generic, try to extract better artist info
+        if track_metadata.get('artist') in ['Unknown Artist', 'Various Artists', None]:
+            # Try to extract from track title
+            track_title = entry.get('title', '')
+            extracted_artist, _ = self.extract_title_artist(track_title)
+            if extracted_artist and extracted_artist != 'Unknown Artist':
+                track_metadata['artist'] = extracted_artist
+
+        return track_metadata
+
+    def _process_track(self, idx, filename, entry, base_metadata, release_tracks=None):
+        """Enrich one album track with metadata and write its tags.
+
+        Runs in a worker thread during album downloads. Track metadata from
+        the album's release lookup wins; otherwise the track gets its own
+        MusicBrainz enrichment. Returns a tuple of
+        (idx, filename or None, success).
+        """
+        try:
+            print(f"\nProcessing Track {idx}...")
+
+            # Enrich with MusicBrainz if enabled, reusing the album release
+            # data when the lookup covered this position
+            print(f"  └─ Searching for additional metadata...")
+            track_metadata = self._build_track_metadata(entry, base_metadata, idx)
+            release_metadata = (release_tracks or {}).get(idx)
+            if release_metadata:
+                final_track_metadata = {**track_metadata, **release_metadata}
+            else:
+                final_track_metadata = self.enrich_metadata(track_metadata, entry)
+
+            # The hook numbers tracks by playlist index; keep ours authoritative
+            final_track_metadata['track'] = str(idx)
+
+            # Update metadata for this track
+            print(f"  └─ Updating metadata...")
+            if self.update_metadata(filename, final_track_metadata):
+                print(f"✓ Track {idx}: Successfully processed")
+            else:
+                print(f"⚠ Track {idx}: Downloaded but failed to update metadata")
+            return idx, filename, True
+
+        except Exception as e:
+            print(f"✗ Track {idx}: Error processing - {str(e)}")
+            return idx, None, False
+
+    def _already_have(self, file_path, video_id):
+        """Return True when file_path is a finished download of video_id.
+
+        A non-empty file at the expected path is accepted; when the tag
+        carries our TXXX:youtube_id frame it must match, which keeps the
+        check honest across retitled uploads.
+        """
+        try:
+            if os.path.getsize(file_path) == 0:
+                return False
+        except OSError:
+            return False
+        if video_id:
+            try:
+                from mutagen.id3 import ID3
+                frames = ID3(file_path).getall('TXXX:youtube_id')
+                if frames and frames[0].text and frames[0].text[0] != video_id:
+                    return False
+            except Exception:
+                pass  # No readable tag; trust the path match
+        return True
+
+    def _shared_frame(self, frame_cls, text):
+        """Return a memoized text frame for values every album track shares.
+
+        Artist, album, year and genre repeat across an album; frames are
+        never mutated after construction, so one instance per value can be
+        attached to every track's tag instead of rebuilding it each time.
+        """
+        key = (frame_cls.__name__, text)
+        frame = self._frame_cache.get(key)
+        if frame is None:
+            frame = frame_cls(encoding=3, text=text)
+            self._frame_cache[key] = frame
+        return frame
+
+    def update_metadata(self, file_path, metadata):
+        """Update metadata of an MP3 file including album art."""
+        # Buffer the per-field report and write it in one call at the end:
+        # concurrent album workers would otherwise interleave their lines
+        # and serialize on the print lock for every field
+        lines = []
+        try:
+            from mutagen.id3 import (
+                ID3, ID3NoHeaderError, APIC, TALB, TPE1, TPE2, TIT2, TRCK, TXXX, TYER, TCON
+            )
+
+
+            # Check if file exists
+            if not os.path.isfile(file_path):
+                print(f"Error: File not found: {file_path}")
+                return False
+            
+            # Try to create ID3 tags if they don't exist
+            fresh_tag = False
+            try:
+                audio = ID3(file_path)
+            except ID3NoHeaderError:
+                # If ID3 tag doesn't exist, create one
+                audio = ID3()
+                fresh_tag = True
+            
+            # Update metadata tags
+            if 'title' in metadata:
+                audio['TIT2'] = TIT2(encoding=3, text=metadata['title'])
+                lines.append(f"  └─ Title: {metadata['title']}")
+            
+            if 'artist' in metadata:
+                audio['TPE1'] = self._shared_frame(TPE1, metadata['artist'])
+                audio['TPE2'] = self._shared_frame(TPE2, metadata['artist'])  # Album artist
+                lines.append(f"  └─ Artist: {metadata['artist']}")
+
+            if 'album' in metadata:
+                audio['TALB'] = self._shared_frame(TALB, metadata['album'])
+                lines.append(f"  └─ Album: {metadata['album']}")
+
+            if 'track' in metadata:
+                audio['TRCK'] = TRCK(encoding=3, text=metadata['track'])
+                lines.append(f"  └─ Track: {metadata['track']}")
+
+            if 'year' in metadata:
+                audio['TYER'] = self._shared_frame(TYER, metadata['year'])
+                lines.append(f"  └─ Year: {metadata['year']}")
+
+            if 'genre' in metadata:
+                audio['TCON'] = self._shared_frame(TCON, metadata['genre'])
+                lines.append(f"  └─ Genre: {metadata['genre']}")
+
+            if 'youtube_id' in metadata:
+                # Lets later runs recognize the file and skip re-downloading
+                audio['TXXX:youtube_id'] = TXXX(encoding=3, desc='youtube_id',
+                                                text=metadata['youtube_id'])
+            
+            # Download and add album art
+            if self.download_album_art and 'album_art_url' in metadata:
+                album_art = self._fetch_album_art(metadata['album_art_url'])
+                if album_art:
+                    album_art_data, mime_type = album_art
+
+                    # Keep one cover.jpg beside the tracks so players and
+                    # re-runs can use it without another fetch
+                    if mime_type == 'image/jpeg':
+                        cover_path = os.path.join(os.path.dirname(file_path), 'cover.jpg')
+                        if not os.path.exists(cover_path):
+                            try:
+                                with open(cover_path, 'wb') as cover_file:
+                                    cover_file.write(album_art_data)
+                            except OSError:
+                                pass
+
+                    # Add album art to ID3 tags; the APIC frame carries the
+                    # full image bytes, so one instance is shared per URL
+                    apic_key = ('APIC', metadata['album_art_url'])
+                    apic = self._frame_cache.get(apic_key)
+                    if apic is None:
+                        apic = APIC(
+                            encoding=3,  # UTF-8
+                            mime=mime_type,
+                            type=3,  # Cover (front)
+                            desc='Cover',
+                            data=album_art_data
+                        )
+                        self._frame_cache[apic_key] = apic
+                    audio['APIC'] = apic
+                    lines.append("  └─ Album art: Downloaded and embedded")
+                else:
+                    lines.append("  └─ Album art: Failed to download")
+            elif not self.download_album_art:
+                lines.append("  └─ Album art: Skipped (disabled)")
+            
+            # Save changes. ID3v2.3 for wide player compatibility. A brand-new
+            # tag reserves 64KiB of padding so later edits (a bigger cover,
+            # extra frames) update in place; an existing tag keeps its padding
+            # so mutagen never rewrites the audio payload
+            if fresh_tag:
+                padding = lambda info: max(0, 65536 - info.size)
+            else:
+                padding = lambda info: max(0, info.padding)
+            audio.save(file_path, v2_version=3, padding=padding)
+            lines.append(f"✓ Updated metadata for: {os.path.basename(file_path)}")
+            sys.stdout.write('\n'.join(lines) + '\n')
+            sys.stdout.flush()
+            return True
+            
+        except Exception as e:
+            lines.append(f"Error updating metadata: {e}")
+            sys.stdout.write('\n'.join(lines) + '\n')
+            sys.stdout.flush()
+            return False
+
+def _classify_error(exc):
+    """Map an exception to the exit codes documented in --help.
+
+    Lets batch orchestrators tell a retryable network hiccup from a
+    broken yt-dlp or a tag-only failure without re-downloading.
+    """
+    try:
+        import yt_dlp
+        if isinstance(exc, yt_dlp.utils.DownloadError):
+            return 2
+    except ImportError:
+        pass
+    try:
+        import requests
+        if isinstance(exc, requests.RequestException):
+            return 3
+    except ImportError:
+        pass
+    try:
+        from mutagen import MutagenError
+        if isinstance(exc, MutagenError):
+            return 4
+    except ImportError:
+        pass
+    return 1
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Download music and update metadata',
+        epilog='Exit codes: 0 success, 2 download error, 3 network error, '
+               '4 tagging error, 1 anything else.')
+    parser.add_argument('url', nargs='*', help='URL(s) of the songs or albums to download')
+    parser.add_argument('--output', '-o', default='downloads', help='Output directory')
+    parser.add_argument('--album', help='Album name (optional, auto-detected)')
+    parser.add_argument('--artist', help='Artist name (optional, auto-detected)')
+    parser.add_argument('--title', help='Song title (optional, auto-detected)')
+    parser.add_argument('--year', help='Release year (optional, auto-detected)')
+    parser.add_argument('--genre', help='Music genre (optional, auto-detected)')
+    parser.add_argument('--album-mode', '-a', action='store_true', help='Download as album (forces playlist download)')
+    parser.add_argument('--no-auto-metadata', action='store_true', help='Disable automatic metadata detection')
+    parser.add_argument('--concurrency', type=int, default=_default_workers(),
+                        help='Parallel workers for album track downloads'
+                             ' (default: 2x usable cores, capped at 8)')
+    parser.add_argument('--no-album-art', action='store_true', help='Skip downloading album art')
+    parser.add_argument('--list-formats', action='store_true', help='List available formats for the URL (for debugging)')
+    parser.add_argument('--update-ytdlp', action='store_true', help='Update yt-dlp before downloading')
+    parser.add_argument('--no-cache', action='store_true', help='Disable the on-disk metadata/art cache')
+    parser.add_argument('--clear-cache', action='store_true', help='Empty the on-disk metadata/art cache')
+    parser.add_argument('--batch-file', '-b', help="File with one URL per line ('-' reads from stdin)")
+    parser.add_argument('--json', action='store_true',
+                        help='Emit one JSON event line per track (started/done/error) for scripts')
+    
+    args = parser.parse_args()
+
+    if args.json:
+        # Keep stdout for the JSON event stream only; all the human-facing
+        # prints throughout the module land on stderr instead
+        sys.stdout = sys.stderr
+    
+    if args.update_ytdlp:
+        print("Updating yt-dlp...")
+        import subprocess
+        try:
+            # Stream pip's output as it arrives instead of buffering the
+            # whole log and sitting silent until it finishes
+            proc = subprocess.Popen(
+                [sys.executable, '-m', 'pip', 'install', '--upgrade', 'yt-dlp'],
+                stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, bufsize=1)
+            for line in proc.stdout:
+                print(line, end='')
+            if proc.wait() == 0:
+                print("yt-dlp updated successfully!")
+            else:
+                print("Failed to update yt-dlp (see output above)")
+        except Exception as e:
+            print(f"Error updating yt-dlp: {e}")
+        return
+    
+    # Collect URLs from the positional arguments and the batch file; the
+    # downloader (and its YoutubeDL/session state) is shared across them
+    urls = list(args.url)
+    if args.batch_file:
+        try:
+            if args.batch_file == '-':
+                batch_text = sys.stdin.read()
+            else:
+                batch_text = Path(args.batch_file).read_text()
+        except OSError as e:
+            parser.error(f"Cannot read batch file: {e}")
+        urls.extend(
+            line for line in map(str.strip, batch_text.splitlines())
+            if line and not line.startswith('#'))
+
+    if not urls and not args.clear_cache:
+        parser.error("URL is required unless using --update-ytdlp or --clear-cache")
+
+    # Format listing needs nothing but yt-dlp; skip downloader construction
+    if args.list_formats:
+        for url in urls:
+            _list_formats(url)
+        return
+    
+    downloader = MusicDownloader(args.output, not args.no_auto_metadata, not args.no_album_art,
+                                 max_workers=max(1, args.concurrency),
+                                 use_cache=not args.no_cache,
+                                 json_events=args.json)
+
+    if args.clear_cache:
+        if downloader._mb_disk_cache is not None:
+            downloader._mb_disk_cache.clear()
+            print("Cleared the on-disk metadata cache")
+        if not urls:
+            return
+    
+    metadata = {
+        'artist': args.artist,
+        'album': args.album,
+        'title': args.title,
+        'year': args.year,
+        'genre': args.genre
+    }
+    
+    # Filter out None values
+    metadata = {k: v for k, v in metadata.items() if v is not None}
+    
+    # Errors are handled per URL so one bad link doesn't kill a batch;
+    # the first classified failure decides the exit code
+    exit_code = 0
+    for url in urls:
+        try:
+            if args.album_mode:
+                print(f"Downloading album from: {url}")
+                album_path = downloader.download_album(url, metadata)
+                if album_path:
+                    print(f"Album downloaded to: {album_path}")
+                else:
+                    print("Album download failed or was incomplete")
+                    exit_code = exit_code or 1
+            else:
+                print(f"Downloading song from: {url}")
+                song_path = downloader.download_song(url, metadata)
+                if song_path:
+                    print(f"Song downloaded to: {song_path}")
+                else:
+                    print("Song download failed")
+                    exit_code = exit_code or 1
+        except Exception as e:
+            print(f"Download failed with error: {e}")
+            print("\nTroubleshooting steps:")
+            print("1. Update yt-dlp: python MusicDownloader.py --update-ytdlp")
+            print("2. Check available formats: python MusicDownloader.py --list-formats <URL>")
+            print("3. Verify the URL is accessible in your browser")
+            exit_code = exit_code or _classify_error(e)
+
+    if exit_code:
+        sys.exit(exit_code)
+
+if __name__ == "__main__":
+    main()